@@ -14,6 +14,25 @@ class Settings(BaseSettings):
     AGENT_TEMPERATURE: float = 0.7
     AGENT_MAX_ITERATIONS: int = 10
 
+    # admission control for calls to the model server
+    LLM_MAX_CONCURRENCY: int = 2
+    LLM_QUEUE_LIMIT_INTERACTIVE: int = 32
+    LLM_QUEUE_LIMIT_BACKGROUND: int = 16
+    LLM_QUEUE_LIMIT_NEW_GAME: int = 4
+    LLM_QUEUE_LIMIT_PER_SESSION: int = 8
+    LLM_DEADLINE_INTERACTIVE: float = 30.0 # max seconds a call may wait in queue
+    LLM_DEADLINE_BACKGROUND: float = 60.0
+    LLM_DEADLINE_NEW_GAME: float = 120.0
+    LLM_INITIAL_SERVICE_TIME: float = 2.0 # seed for the queue wait estimate
+
+    # voice pipeline (/ws/voice)
+    VOICE_STT_ENGINE: str = "fake"
+    VOICE_TTS_ENGINE: str = "fake"
+    VOICE_SAMPLE_RATE: int = 16000 # pcm16 mono, both directions
+    VOICE_VAD_THRESHOLD: int = 500 # mean absolute sample amplitude counted as speech
+    VOICE_EOU_SILENCE_MS: int = 600 # trailing silence that ends an utterance
+    VOICE_QUEUE_SIZE: int = 32 # bound on each queue between pipeline stages
+
     class Config:
         env_file = ".env"
 
@@ -1,39 +1,62 @@
 from typing import Dict, Any, Optional
 from fastapi import BackgroundTasks
 
+from app.services.admission import Priority
 from app.services.llm import LLMService
 from .models import GameState, Room, Direction
 from .storage import save_game, load_game
-from .generator import initial_generation, expand_room
+from .generator import initial_generation, expand_room, prefetch_room
+
 
 class GameEngine:
     def __init__(self, save_path: str = "data/savegame.json"):
         self.save_path = save_path
         self.state: Optional[GameState] = None
 
-    async def get_state(self, llm_service: LLMService) -> GameState:
+    async def get_state(self, llm_service: LLMService, session_id: str = "default") -> GameState:
         if not self.state:
-            await self.init_game(llm_service)
+            await self.init_game(llm_service, session_id)
         assert self.state is not None  # guaranteed after init_game
         return self.state
 
-    async def init_game(self, llm_service: LLMService):
+    async def init_game(self, llm_service: LLMService, session_id: str = "default", background_tasks: Optional[BackgroundTasks] = None):
         try:
             # print(f"Loading game from {self.save_path}")
             self.state = load_game(self.save_path)
         except Exception:
             # print("Save not found, generating new game...")
-            self.state = await initial_generation(llm_service)
+            # one admission deadline for every model call of the new game
+            deadline = llm_service.admission.deadline_for(Priority.NEW_GAME)
+            self.state = await initial_generation(llm_service, session_id, deadline, background_tasks)
             save_game(self.state, self.save_path)
             
-    async def process_turn(self, user_input: str, llm_service: LLMService, background_tasks: Optional[BackgroundTasks] = None) -> tuple[str, dict]:
+    async def process_turn(self, user_input: str, llm_service: LLMService, background_tasks: Optional[BackgroundTasks] = None, session_id: str = "default") -> tuple[str, dict]:
+        # one admission deadline shared by classification and narration
+        deadline = llm_service.admission.deadline_for(Priority.INTERACTIVE)
+        (intent_data, narrative_prompt, result_text) = await self.resolve_turn(user_input, llm_service, background_tasks, session_id, deadline)
+        try:
+            final_narrative = await llm_service.generate_text(narrative_prompt, session_id=session_id, deadline=deadline)
+        except Exception as e:
+            # the action has already been applied, so never fail the turn over its narration
+            print(f"Narration failed, using game logic result: {e}")
+            final_narrative = result_text
+        self.record_turn(user_input, final_narrative)
+        return (final_narrative, intent_data)
+
+    async def resolve_turn(self, user_input: str, llm_service: LLMService, background_tasks: Optional[BackgroundTasks] = None, session_id: str = "default", deadline: Optional[float] = None) -> tuple[dict, str, str]:
+        # classify and apply the action; returns the intent, the prompt to narrate it with and the
+        # plain game logic result, so callers can either generate the narrative in one go or stream it.
+        # the action is applied on return: callers must record_turn, using the result if narration fails.
+        # pass the same deadline to the narration call so the whole turn shares one admission budget
         if not self.state:
-            await self.init_game(llm_service)
+            await self.init_game(llm_service, session_id, background_tasks)
+        if deadline is None:
+            deadline = llm_service.admission.deadline_for(Priority.INTERACTIVE)
         
         assert self.state is not None  # guaranteed after init_game
             
         # 1. Classify Intent
-        intent_data = await llm_service.classify_intent(user_input)
+        intent_data = await llm_service.classify_intent(user_input, session_id, deadline)
         
         action_type = intent_data.get("action", "unknown").lower()
         result_text = ""
@@ -44,9 +67,14 @@ class GameEngine:
             direction = intent_data.get("direction", intent_data.get("target", "")).lower()
             if direction in current_room.exits:
                 new_room_id = current_room.exits[direction]
-                self.state.player.current_room_id = new_room_id
                 new_room = self.state.rooms[new_room_id]
                 
+                # prefetch missed this room (shed or not scheduled yet), expand it as part of the turn
+                if not new_room.is_generated:
+                    await expand_room(new_room, self.state.theme, llm_service, current_room.description, priority=Priority.INTERACTIVE, session_id=session_id, deadline=deadline)
+                
+                self.state.player.current_room_id = new_room_id
+                
                 result_text = f"You move {direction}. "
                 
                 # Trigger generation for neighbors
@@ -54,7 +82,7 @@ class GameEngine:
                      for _, neighbor_id in new_room.exits.items():
                          neighbor = self.state.rooms[neighbor_id]
                          if not neighbor.is_generated:
-                             background_tasks.add_task(expand_room, neighbor, self.state.theme, llm_service, new_room.description)
+                             background_tasks.add_task(prefetch_room, neighbor, self.state.theme, llm_service, new_room.description, session_id)
 
                 result_text += new_room.description
                 if new_room.enemies:
@@ -117,10 +145,9 @@ class GameEngine:
         Task: Describe the outcome of the action narratively. Keep it concise (1-2 sentences).
         """
         
-        final_narrative = await llm_service.generate_text(narrative_prompt)
-        
-        assert self.state is not None  # guaranteed at this point
+        return (intent_data, narrative_prompt, result_text)
+
+    def record_turn(self, user_input: str, final_narrative: str):
+        assert self.state is not None  # guaranteed after resolve_turn
         self.state.history.append(f"Action: {user_input} | Result: {final_narrative}")
         save_game(self.state, self.save_path)
-        
-        return (final_narrative, intent_data)
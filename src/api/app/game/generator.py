@@ -1,6 +1,9 @@
+import asyncio
 import random
 import json
-from typing import List, Dict, Set, Tuple
+from typing import List, Dict, Set, Tuple, Optional
+from fastapi import BackgroundTasks
+from app.services.admission import AdmissionRejected, Priority
 from .models import Room, Direction, GameState, PlayerState, Item, Enemy, ItemType, EnemyType
 
 # Topology Generator
@@ -78,15 +81,51 @@ def _get_opposite_direction(direction: Direction) -> Direction:
     return Direction.NORTH
 
 # LLM Hooks
-async def generate_theme(llm_service) -> str:
+async def generate_theme(llm_service, session_id: str = "default", deadline: float | None = None) -> str:
     prompt = "Invent a unique, creative, and coherent dungeon theme/setting. Describe it in 1-2 sentences."
-    theme = await llm_service.generate_text(prompt, system_prompt="You are a creative dungeon master.")
+    theme = await llm_service.generate_text(prompt, system_prompt="You are a creative dungeon master.", priority=Priority.NEW_GAME, session_id=session_id, deadline=deadline)
     return theme.strip()
 
-async def expand_room(room: Room, theme: str, llm_service, previous_room_desc: str | None = None):
-    if room.is_generated:
-        return
+# one in-flight expansion per room (keyed by object id, rooms are unhashable models)
+# so a turn and a queued prefetch never both generate and append to the same room
+_expansions: Dict[int, Tuple[Priority, asyncio.Task]] = {}
 
+async def expand_room(room: Room, theme: str, llm_service, previous_room_desc: str | None = None, priority: Priority = Priority.BACKGROUND, session_id: str = "default", deadline: float | None = None):
+    while not room.is_generated:
+        in_flight = _expansions.get(id(room))
+        if in_flight is not None and priority < in_flight[0]:
+            # a more urgent caller takes over from a lower priority expansion still queued or running
+            in_flight[1].cancel()
+            _expansions.pop(id(room), None)
+            in_flight = None
+        
+        if in_flight is None:
+            task = asyncio.create_task(_generate_room(room, theme, llm_service, previous_room_desc, priority, session_id, deadline))
+            _expansions[id(room)] = (priority, task)
+            task.add_done_callback(lambda done, key=id(room): _finish_expansion(key, done))
+        else:
+            task = in_flight[1]
+        
+        try:
+            # shielded so a caller going away does not cancel an expansion others may be waiting on
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            current = asyncio.current_task()
+            if current is not None and current.cancelling():
+                raise
+            # taken over by a more urgent caller; loop to wait for its result
+        except AdmissionRejected:
+            if in_flight is None:
+                raise
+            # the expansion we joined was shed, try again on our own budget
+
+def _finish_expansion(key: int, task: asyncio.Task):
+    if _expansions.get(key, (None, None))[1] is task:
+        del _expansions[key]
+    if not task.cancelled():
+        task.exception()  # retrieved here so orphaned expansions do not log unhandled errors
+
+async def _generate_room(room: Room, theme: str, llm_service, previous_room_desc: str | None, priority: Priority, session_id: str, deadline: float | None):
     # Create prompt
     prompt = f"""
     Theme: {theme}
@@ -108,7 +147,10 @@ async def expand_room(room: Room, theme: str, llm_service, previous_room_desc: s
     """
     
     try:
-        response_text = await llm_service.generate_text(prompt, system_prompt="You are a dungeon generator. Output valid JSON only.")
+        response_text = await llm_service.generate_text(prompt, system_prompt="You are a dungeon generator. Output valid JSON only.", priority=priority, session_id=session_id, deadline=deadline)
+        if room.is_generated:
+            # another expansion finished while this one was queued; drop the late result
+            return
         
         # clean code blocks if present
         clean_text = response_text.replace("```json", "").replace("```", "").strip()
@@ -136,6 +178,9 @@ async def expand_room(room: Room, theme: str, llm_service, previous_room_desc: s
                 etype = EnemyType.OTHER
             room.enemies.append(Enemy(name=enemy_data["name"], description=enemy_data.get("description", ""), type=etype, is_generated=True))
             
+    except AdmissionRejected:
+        # shed under load: leave the room ungenerated so it can be expanded later
+        raise
     except Exception as e:
         print(f"Error parsing room generation: {e}")
         # Fallback
@@ -143,9 +188,16 @@ async def expand_room(room: Room, theme: str, llm_service, previous_room_desc: s
     
     room.is_generated = True
 
-async def initial_generation(llm_service) -> GameState:
+async def prefetch_room(room: Room, theme: str, llm_service, previous_room_desc: str, session_id: str = "default"):
+    # background expansion is best effort; if it is shed the room is expanded when the player walks in
+    try:
+        await expand_room(room, theme, llm_service, previous_room_desc, session_id=session_id)
+    except AdmissionRejected as e:
+        print(f"Skipped prefetch of {room.id}: {e.reason}")
+
+async def initial_generation(llm_service, session_id: str = "default", deadline: float | None = None, background_tasks: Optional[BackgroundTasks] = None) -> GameState:
     rooms = generate_topology(num_rooms=10)
-    theme = await generate_theme(llm_service)
+    theme = await generate_theme(llm_service, session_id, deadline)
     
     start_room_id = "room_0"
     player = PlayerState(current_room_id=start_room_id)
@@ -159,11 +211,16 @@ async def initial_generation(llm_service) -> GameState:
     
     # Expand start room
     start_room = rooms[start_room_id]
-    await expand_room(start_room, theme, llm_service)
+    await expand_room(start_room, theme, llm_service, priority=Priority.NEW_GAME, session_id=session_id, deadline=deadline)
     
     # Expand neighbors of start room (eagerly)
     for exit_dir, neighbor_id in start_room.exits.items():
         neighbor = rooms[neighbor_id]
-        await expand_room(neighbor, theme, llm_service, previous_room_desc=start_room.description)
+        try:
+            await expand_room(neighbor, theme, llm_service, previous_room_desc=start_room.description, priority=Priority.NEW_GAME, session_id=session_id, deadline=deadline)
+        except AdmissionRejected:
+            # the game is playable without its neighbours; hand them to background prefetch
+            if background_tasks:
+                background_tasks.add_task(prefetch_room, neighbor, theme, llm_service, start_room.description, session_id)
         
     return game_state
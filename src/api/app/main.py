@@ -1,10 +1,17 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+import asyncio
+import json
+import logging
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Request, WebSocket
+from fastapi.requests import HTTPConnection
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, Any
 from app.core.config import settings
 from app.game.game import GameEngine
+from app.services.admission import AdmissionRejected
 from app.services.llm import LLMService
+from app.voice.engines import create_stt_engine, create_tts_engine
+from app.voice.pipeline import VoicePipeline, END_OF_UTTERANCE
 
 
 # pydantic models for request/response
@@ -53,11 +60,29 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+logger = logging.getLogger(__name__)
+
 # initialize game engine and llm provider
 game_engine = GameEngine()
 llm_provider = LLMService()
 
 
+def get_session_id(connection: HTTPConnection) -> str:
+    """identify the caller for per-session fairness in llm admission control"""
+    session_id = connection.headers.get("x-session-id") or connection.query_params.get("session_id")
+    if session_id:
+        return session_id
+    return connection.client.host if connection.client else "default"
+
+
+def overloaded(e: AdmissionRejected) -> HTTPException:
+    """map a shed llm call to 503 so clients back off instead of seeing a generic 500"""
+    return HTTPException(
+        status_code=503,
+        detail=f"server busy: {e.reason}",
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
 
 @app.get("/")
 async def root() -> dict[str, Any]:
@@ -66,16 +91,18 @@ async def root() -> dict[str, Any]:
         "status": "healthy",
         "ollama_url": settings.OLLAMA_BASE_URL,
         "ollama_model": settings.OLLAMA_GEN_MODEL,
+        "llm_admission": llm_provider.admission.stats(),
         "endpoints": {
             "new-game": "/api/new-game",
             "load-game": "/api/load-game",
-            "game-turn": "/api/game/turn"
+            "game-turn": "/api/game/turn",
+            "voice": "/ws/voice"
         }
     }
 
 
 @app.post("/api/new-game", response_model=NewGameResponse)
-async def new_game(request: NewGameRequest):
+async def new_game(request: NewGameRequest, http_request: Request, background_tasks: BackgroundTasks):
     """start a new game with fresh game state"""
     if not llm_provider:
         raise HTTPException(status_code=503, detail="llm provider not initialized")
@@ -84,9 +111,10 @@ async def new_game(request: NewGameRequest):
         # create new game engine instance
         save_path = request.save_path or "data/savegame.json"
         new_game_engine = GameEngine(save_path)
+        session_id = get_session_id(http_request)
         
         # initialize with fresh game state
-        await new_game_engine.init_game(llm_provider)
+        await new_game_engine.init_game(llm_provider, session_id, background_tasks)
         
         # replace global game engine
         global game_engine
@@ -101,12 +129,14 @@ async def new_game(request: NewGameRequest):
             game_id=state.player.current_room_id,
             initial_room=current_room.description
         )
+    except AdmissionRejected as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"failed to start new game: {str(e)}")
 
 
 @app.post("/api/load-game", response_model=LoadGameResponse)
-async def load_game_endpoint(request: LoadGameRequest):
+async def load_game_endpoint(request: LoadGameRequest, http_request: Request, background_tasks: BackgroundTasks):
     """load an existing game from save file"""
     if not llm_provider:
         raise HTTPException(status_code=503, detail="llm provider not initialized")
@@ -114,9 +144,10 @@ async def load_game_endpoint(request: LoadGameRequest):
     try:
         save_path = request.save_path or "data/savegame.json"
         loaded_game_engine = GameEngine(save_path)
+        session_id = get_session_id(http_request)
         
         # load existing game state
-        await loaded_game_engine.init_game(llm_provider)
+        await loaded_game_engine.init_game(llm_provider, session_id, background_tasks)
         
         # replace global game engine
         global game_engine
@@ -131,23 +162,92 @@ async def load_game_endpoint(request: LoadGameRequest):
             game_id=state.player.current_room_id,
             current_room=current_room.description
         )
+    except AdmissionRejected as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"failed to load game: {str(e)}")
 
 
 @app.post("/api/game/turn", response_model=GameTurnResponse)
-async def process_game_turn(request: GameTurnRequest, background_tasks: BackgroundTasks):
+async def process_game_turn(request: GameTurnRequest, http_request: Request, background_tasks: BackgroundTasks):
     """process a game turn with user input"""
     if not llm_provider:
         raise HTTPException(status_code=503, detail="llm provider not initialized")
     
     try:
-        (narrative, action) = await game_engine.process_turn(request.user_input, llm_provider, background_tasks)
+        session_id = get_session_id(http_request)
+        (narrative, action) = await game_engine.process_turn(request.user_input, llm_provider, background_tasks, session_id)
         return GameTurnResponse(narrative=narrative, action=action)
+    except AdmissionRejected as e:
+        raise overloaded(e)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"game turn failed: {str(e)}")
 
 
+@app.websocket("/ws/voice")
+async def voice_session(websocket: WebSocket):
+    """
+    streaming voice turns. send pcm16 mono audio as binary frames and optionally
+    {"type": "end"} to close an utterance early; receive partial/transcript/intent/
+    narration/speech/turn_end/error json messages and tts audio as binary frames.
+    """
+    await websocket.accept()
+    
+    pipeline = VoicePipeline(
+        lambda: game_engine,
+        llm_provider,
+        create_stt_engine(settings.VOICE_STT_ENGINE),
+        create_tts_engine(settings.VOICE_TTS_ENGINE, sample_rate=settings.VOICE_SAMPLE_RATE),
+        session_id=get_session_id(websocket),
+        sample_rate=settings.VOICE_SAMPLE_RATE,
+        vad_threshold=settings.VOICE_VAD_THRESHOLD,
+        eou_silence_ms=settings.VOICE_EOU_SILENCE_MS,
+        queue_size=settings.VOICE_QUEUE_SIZE,
+    )
+    
+    async def receive_audio():
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if message.get("bytes"):
+                await pipeline.audio_in.put(message["bytes"])
+            elif message.get("text"):
+                try:
+                    control = json.loads(message["text"])
+                except ValueError:
+                    continue
+                if control.get("type") == "end":
+                    await pipeline.audio_in.put(END_OF_UTTERANCE)
+    
+    async def send_events():
+        while (event := await pipeline.events.get()) is not None:
+            if isinstance(event, bytes):
+                await websocket.send_bytes(event)
+            else:
+                await websocket.send_json(event)
+    
+    runner = asyncio.create_task(pipeline.run())
+    sender = asyncio.create_task(send_events())
+    receiver = asyncio.create_task(receive_audio())
+    try:
+        # the session lives until the client disconnects or the pipeline dies
+        (done, _) = await asyncio.wait({receiver, runner}, return_when=asyncio.FIRST_COMPLETED)
+        if runner in done and runner.exception() is not None:
+            sender.cancel()
+            error = runner.exception()
+            logger.error("voice pipeline failed", exc_info=error)
+            try:
+                await websocket.send_json({"type": "error", "status": 500, "detail": f"voice pipeline failed: {error!r}"})
+                await websocket.close(code=1011)
+            except Exception:
+                pass  # client already gone
+    finally:
+        for task in (runner, sender, receiver):
+            task.cancel()
+        await asyncio.gather(runner, sender, receiver, return_exceptions=True)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -0,0 +1,192 @@
+import asyncio
+import math
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import AsyncIterator
+
+
+class Priority(IntEnum):
+	"""priority classes for llm-bound work, lower value is served first"""
+	INTERACTIVE = 0  # player turns: classify + narrate
+	BACKGROUND = 1   # expand_room prefetch of neighbouring rooms
+	NEW_GAME = 2     # theme and initial room generation
+
+
+class AdmissionRejected(Exception):
+	"""raised when a call is shed instead of queued. retry_after is in whole seconds."""
+
+	def __init__(self, reason: str, retry_after: int):
+		super().__init__(reason)
+		self.reason = reason
+		self.retry_after = retry_after
+
+
+@dataclass
+class _Waiter:
+	future: asyncio.Future
+	priority: Priority
+	session_id: str
+	deadline: float
+
+
+class AdmissionController:
+	"""
+	gate in front of the model server.
+	at most max_concurrency calls run at once; the rest wait in bounded
+	per-priority queues. within a priority class sessions are served
+	round-robin so one chatty client cannot starve the others. calls that
+	cannot start before their deadline are rejected up front.
+
+	deadlines are absolute event-loop times. a request that makes several
+	model calls should take one deadline from deadline_for() and pass it to
+	every slot() so the calls share a single queueing budget. a free slot is
+	always taken; the deadline only bounds time spent queued.
+	"""
+
+	def __init__(
+		self,
+		max_concurrency: int,
+		queue_limits: dict[Priority, int],
+		deadlines: dict[Priority, float],
+		max_queued_per_session: int,
+		initial_service_time: float = 2.0,
+	):
+		self.max_concurrency = max(1, max_concurrency)
+		self.queue_limits = queue_limits
+		self.deadlines = deadlines
+		self.max_queued_per_session = max_queued_per_session
+
+		self._active = 0
+		# priority -> session_id -> waiters, ordered for round-robin
+		self._queues: dict[Priority, OrderedDict[str, deque[_Waiter]]] = {p: OrderedDict() for p in Priority}
+		self._queued: dict[Priority, int] = {p: 0 for p in Priority}
+		# moving average of how long a call holds a slot, used to predict queue wait
+		self._service_time = initial_service_time
+
+	@asynccontextmanager
+	async def slot(self, priority: Priority, session_id: str = "default", deadline: float | None = None) -> AsyncIterator[None]:
+		"""hold one model-server slot for the duration of the block"""
+		if deadline is None:
+			deadline = self.deadline_for(priority)
+		await self._acquire(priority, session_id, deadline)
+		loop = asyncio.get_running_loop()
+		started = loop.time()
+		try:
+			yield
+		finally:
+			self._service_time = 0.8 * self._service_time + 0.2 * (loop.time() - started)
+			self._release()
+
+	def deadline_for(self, priority: Priority) -> float:
+		"""absolute deadline for a request of this priority starting now"""
+		return asyncio.get_running_loop().time() + self.deadlines[priority]
+
+	def estimated_wait(self, priority: Priority) -> float:
+		"""rough seconds until a new call at this priority would start"""
+		if self._active < self.max_concurrency:
+			return 0.0
+		return self._queued_wait(priority)
+
+	def stats(self) -> dict:
+		return {
+			"active": self._active,
+			"max_concurrency": self.max_concurrency,
+			"queued": {p.name.lower(): self._queued[p] for p in Priority},
+			"service_time": round(self._service_time, 3),
+		}
+
+	def _queued_wait(self, priority: Priority) -> float:
+		# wait behind everything queued at this priority or above, ignoring free slots
+		ahead = sum(self._queued[p] for p in Priority if p <= priority)
+		return (ahead + 1) * self._service_time / self.max_concurrency
+
+	def _retry_after(self, priority: Priority) -> int:
+		return max(1, math.ceil(self._queued_wait(priority)))
+
+	async def _acquire(self, priority: Priority, session_id: str, deadline: float):
+		loop = asyncio.get_running_loop()
+
+		# fast path: free slot (waiters only exist while all slots are busy)
+		if self._active < self.max_concurrency:
+			self._active += 1
+			return
+
+		retry_after = self._retry_after(priority)
+		if self._queued[priority] >= self.queue_limits[priority]:
+			raise AdmissionRejected(f"{priority.name.lower()} queue is full", retry_after)
+
+		session_queue = self._queues[priority].get(session_id)
+		if session_queue is not None and len(session_queue) >= self.max_queued_per_session:
+			raise AdmissionRejected("too many queued requests for this session", retry_after)
+
+		# shed now rather than time out later if the wait already exceeds what is left of the deadline
+		budget = deadline - loop.time()
+		if self.estimated_wait(priority) > budget:
+			raise AdmissionRejected("server is saturated", retry_after)
+
+		waiter = _Waiter(loop.create_future(), priority, session_id, deadline)
+		self._queues[priority].setdefault(session_id, deque()).append(waiter)
+		self._queued[priority] += 1
+
+		try:
+			await asyncio.wait_for(waiter.future, timeout=budget)
+		except asyncio.TimeoutError:
+			if self._granted(waiter):
+				return
+			self._remove(priority, waiter)
+			raise AdmissionRejected("deadline exceeded while queued", retry_after)
+		except asyncio.CancelledError:
+			# caller went away; hand the slot on if we were already granted one
+			if self._granted(waiter):
+				self._release()
+			else:
+				self._remove(priority, waiter)
+			raise
+
+	def _release(self):
+		self._active -= 1
+		self._dispatch()
+
+	def _dispatch(self):
+		loop = asyncio.get_running_loop()
+		while self._active < self.max_concurrency:
+			waiter = self._next_waiter()
+			if waiter is None:
+				return
+			if waiter.future.done():
+				continue
+			if waiter.deadline <= loop.time():
+				waiter.future.set_exception(AdmissionRejected("deadline exceeded while queued", self._retry_after(waiter.priority)))
+				continue
+			self._active += 1
+			waiter.future.set_result(None)
+
+	def _next_waiter(self) -> _Waiter | None:
+		for priority in Priority:
+			sessions = self._queues[priority]
+			if not sessions:
+				continue
+			session_id, waiters = next(iter(sessions.items()))
+			waiter = waiters.popleft()
+			if waiters:
+				sessions.move_to_end(session_id)
+			else:
+				del sessions[session_id]
+			self._queued[priority] -= 1
+			return waiter
+		return None
+
+	def _remove(self, priority: Priority, waiter: _Waiter):
+		waiters = self._queues[priority].get(waiter.session_id)
+		if waiters is None or waiter not in waiters:
+			return
+		waiters.remove(waiter)
+		if not waiters:
+			del self._queues[priority][waiter.session_id]
+		self._queued[priority] -= 1
+
+	@staticmethod
+	def _granted(waiter: _Waiter) -> bool:
+		return waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None
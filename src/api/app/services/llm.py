@@ -1,7 +1,9 @@
+from typing import AsyncIterator
 from langchain_ollama import ChatOllama
 from langchain_core.tools import tool
 from langchain.messages import AIMessage
 from app.core.config import settings
+from app.services.admission import AdmissionController, Priority
 
 
 # action tools defined as standalone functions (required by langchain @tool decorator)
@@ -64,11 +66,54 @@ class LLMService:
 		# bind action tools to classify subagent (bind_tools returns a new instance)
 		self.classify_agent = self.classify_agent_llm.bind_tools(ACTION_TOOLS)
 
-	async def generate_text(self, prompt: str, system_prompt: str | None = None) -> str:
+		# every model call goes through admission control so bursts queue or shed instead of piling up
+		self.admission = AdmissionController(
+			max_concurrency=settings.LLM_MAX_CONCURRENCY,
+			queue_limits={
+				Priority.INTERACTIVE: settings.LLM_QUEUE_LIMIT_INTERACTIVE,
+				Priority.BACKGROUND: settings.LLM_QUEUE_LIMIT_BACKGROUND,
+				Priority.NEW_GAME: settings.LLM_QUEUE_LIMIT_NEW_GAME,
+			},
+			deadlines={
+				Priority.INTERACTIVE: settings.LLM_DEADLINE_INTERACTIVE,
+				Priority.BACKGROUND: settings.LLM_DEADLINE_BACKGROUND,
+				Priority.NEW_GAME: settings.LLM_DEADLINE_NEW_GAME,
+			},
+			max_queued_per_session=settings.LLM_QUEUE_LIMIT_PER_SESSION,
+			initial_service_time=settings.LLM_INITIAL_SERVICE_TIME,
+		)
+
+	async def generate_text(self, prompt: str, system_prompt: str | None = None, priority: Priority = Priority.INTERACTIVE, session_id: str = "default", deadline: float | None = None) -> str:
 		"""
 		generate narrative text using the llm.
 		optionally accepts a system prompt to guide the generation.
+		deadline is the request's absolute admission deadline, shared across its calls.
+		raises AdmissionRejected if the call is shed under load.
 		"""
+		messages = self._build_messages(prompt, system_prompt)
+		
+		# invoke the llm and return the generated text
+		async with self.admission.slot(priority, session_id, deadline):
+			response = await self.generate_text_agent.ainvoke(messages)
+		
+		return self._content_to_text(response.content)
+
+	async def stream_text(self, prompt: str, system_prompt: str | None = None, priority: Priority = Priority.INTERACTIVE, session_id: str = "default", deadline: float | None = None) -> AsyncIterator[str]:
+		"""
+		same as generate_text but yields text deltas as the llm produces them.
+		the admission slot is held until the stream is exhausted or closed, so consume it
+		promptly and close it with contextlib.aclosing.
+		"""
+		messages = self._build_messages(prompt, system_prompt)
+		
+		async with self.admission.slot(priority, session_id, deadline):
+			async for chunk in self.generate_text_agent.astream(messages):
+				text = self._content_to_text(chunk.content)
+				if text:
+					yield text
+
+	@staticmethod
+	def _build_messages(prompt: str, system_prompt: str | None) -> list:
 		from langchain_core.messages import SystemMessage, HumanMessage
 		
 		# build message list with optional system prompt
@@ -76,20 +121,20 @@ class LLMService:
 		if system_prompt:
 			messages.append(SystemMessage(content=system_prompt))
 		messages.append(HumanMessage(content=prompt))
-		
-		# invoke the llm and return the generated text
-		response = await self.generate_text_agent.ainvoke(messages)
-		
+		return messages
+
+	@staticmethod
+	def _content_to_text(content) -> str:
 		# ensure we return a string
-		if isinstance(response.content, str):
-			return response.content
-		elif isinstance(response.content, list):
+		if isinstance(content, str):
+			return content
+		elif isinstance(content, list):
 			# concatenate list items into a single string
-			return " ".join(str(item) for item in response.content)
+			return " ".join(str(item) for item in content)
 		else:
-			return str(response.content)
+			return str(content)
 
-	async def classify_intent(self, user_input: str) -> dict:
+	async def classify_intent(self, user_input: str, session_id: str = "default", deadline: float | None = None) -> dict:
 		"""
 		classify user input into game actions using a subagent with action tools.
 		returns a dict with 'action' and optional 'direction' or 'target' keys.
@@ -101,6 +146,8 @@ class LLMService:
 		- attack: attacking an enemy
 		- inventory: checking inventory
 		- unknown: unrecognized action
+		
+		always runs at interactive priority; raises AdmissionRejected if shed.
 		"""
 		prompt = f"""Analyze the player's input and call the appropriate action tool.
 
@@ -116,7 +163,8 @@ Use the available tools to classify the intent:
 
 Call the most appropriate tool based on the player's intent."""
 
-		response = await self.classify_agent.ainvoke(prompt)
+		async with self.admission.slot(Priority.INTERACTIVE, session_id, deadline):
+			response = await self.classify_agent.ainvoke(prompt)
 		
 		# extract tool call from response
 		if hasattr(response, 'tool_calls') and response.tool_calls:
@@ -0,0 +1,100 @@
+import asyncio
+from typing import AsyncGenerator, Callable, Dict, List, Optional, Protocol
+
+
+class STTEngine(Protocol):
+    """incremental speech-to-text over pcm16 mono audio chunks"""
+
+    async def feed(self, chunk: bytes) -> Optional[str]:
+        """consume one chunk of speech; returns the partial transcript so far, if any"""
+        ...
+
+    async def finalize(self) -> str:
+        """end of utterance: return the final transcript and reset for the next utterance"""
+        ...
+
+
+class TTSEngine(Protocol):
+    """text-to-speech producing pcm16 mono audio"""
+
+    sample_rate: int
+
+    def synthesize(self, text: str) -> AsyncGenerator[bytes, None]:
+        """stream audio chunks for one sentence of text (an async generator, so it can be closed early)"""
+        ...
+
+
+class FakeSTTEngine:
+    """
+    deterministic stand-in for a real stt model.
+    ignores the audio content: every chunk of speech reveals the next word of a
+    scripted utterance, and successive utterances cycle through the script.
+    latency is slept per chunk and on finalize to mimic model cost.
+    """
+
+    def __init__(self, script: Optional[List[str]] = None, latency: float = 0.0, finalize_latency: float = 0.0):
+        self.script = script or ["look around"]
+        self.latency = latency
+        self.finalize_latency = finalize_latency
+        self._utterance_index = 0
+        self._words_heard = 0
+
+    def _current_words(self) -> List[str]:
+        return self.script[self._utterance_index % len(self.script)].split()
+
+    async def feed(self, chunk: bytes) -> Optional[str]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        words = self._current_words()
+        self._words_heard = min(self._words_heard + 1, len(words))
+        return " ".join(words[:self._words_heard])
+
+    async def finalize(self) -> str:
+        if self.finalize_latency:
+            await asyncio.sleep(self.finalize_latency)
+        text = " ".join(self._current_words())
+        self._utterance_index += 1
+        self._words_heard = 0
+        return text
+
+
+class FakeTTSEngine:
+    """
+    deterministic stand-in for a real tts model.
+    emits one chunk of silent pcm16 audio per word, ms_per_word long, sleeping
+    latency before each chunk to mimic synthesis cost.
+    """
+
+    def __init__(self, sample_rate: int = 16000, ms_per_word: int = 250, latency: float = 0.0):
+        self.sample_rate = sample_rate
+        self.ms_per_word = ms_per_word
+        self.latency = latency
+
+    async def synthesize(self, text: str) -> AsyncGenerator[bytes, None]:
+        samples_per_word = self.sample_rate * self.ms_per_word // 1000
+        for _ in text.split():
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            yield b"\x00\x00" * samples_per_word
+
+
+# registries so real engines can be plugged in by name from settings
+STT_ENGINES: Dict[str, Callable[..., STTEngine]] = {
+    "fake": FakeSTTEngine,
+}
+
+TTS_ENGINES: Dict[str, Callable[..., TTSEngine]] = {
+    "fake": FakeTTSEngine,
+}
+
+
+def create_stt_engine(name: str, **kwargs) -> STTEngine:
+    if name not in STT_ENGINES:
+        raise ValueError(f"unknown stt engine: {name} (available: {', '.join(STT_ENGINES)})")
+    return STT_ENGINES[name](**kwargs)
+
+
+def create_tts_engine(name: str, **kwargs) -> TTSEngine:
+    if name not in TTS_ENGINES:
+        raise ValueError(f"unknown tts engine: {name} (available: {', '.join(TTS_ENGINES)})")
+    return TTS_ENGINES[name](**kwargs)
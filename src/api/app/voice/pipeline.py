@@ -0,0 +1,268 @@
+import asyncio
+import re
+import sys
+from array import array
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import BackgroundTasks
+
+from app.game.game import GameEngine
+from app.services.admission import AdmissionRejected, Priority
+from app.services.llm import LLMService
+from .engines import STTEngine, TTSEngine
+
+
+class _EndOfUtterance:
+    """control marker: the client says the user stopped talking (e.g. push-to-talk released)"""
+
+
+END_OF_UTTERANCE = _EndOfUtterance()
+
+# a sentence ends at . ! or ? followed by whitespace; the trailing fragment stays buffered
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+
+def split_sentences(text: str) -> Tuple[List[str], str]:
+    """split streamed text into complete sentences and the unfinished remainder"""
+    parts = SENTENCE_BOUNDARY.split(text)
+    sentences = [p.strip() for p in parts[:-1] if p.strip()]
+    return (sentences, parts[-1])
+
+
+def is_speech(chunk: bytes, threshold: int) -> bool:
+    """energy-based voice activity check on a pcm16 little-endian mono chunk"""
+    samples = array("h")
+    samples.frombytes(chunk[:len(chunk) - len(chunk) % 2])
+    if not samples:
+        return False
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return sum(abs(s) for s in samples) / len(samples) >= threshold
+
+
+@dataclass
+class TurnMetrics:
+    """event-loop timestamps for one spoken turn, reported in ms deltas when the turn ends"""
+    speech_end: float
+    endpoint: Optional[float] = None
+    transcript: Optional[float] = None
+    intent: Optional[float] = None
+    first_token: Optional[float] = None
+    first_sentence: Optional[float] = None
+    first_audio: Optional[float] = None
+    done: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        def ms(start: Optional[float], end: Optional[float]) -> Optional[float]:
+            if start is None or end is None:
+                return None
+            return round((end - start) * 1000, 1)
+
+        return {
+            "endpoint_ms": ms(self.speech_end, self.endpoint),
+            "stt_ms": ms(self.endpoint, self.transcript),
+            "classify_ms": ms(self.transcript, self.intent),
+            "first_token_ms": ms(self.intent, self.first_token),
+            "first_sentence_ms": ms(self.first_token, self.first_sentence),
+            "tts_first_audio_ms": ms(self.first_sentence, self.first_audio),
+            "mouth_to_ear_ms": ms(self.speech_end, self.first_audio),
+            "total_ms": ms(self.speech_end, self.done),
+        }
+
+
+class VoicePipeline:
+    """
+    streaming voice turn loop around GameEngine.
+    stages run concurrently and hand work on through bounded queues:
+
+        audio_in -> stt + endpointing -> classify + streamed narration -> sentence tts -> events
+
+    put pcm16 chunks (or END_OF_UTTERANCE) on audio_in and None to close.
+    events yields json-able dicts and raw pcm16 audio bytes, then None once the pipeline has drained.
+    """
+
+    def __init__(
+        self,
+        get_engine: Callable[[], GameEngine],
+        llm_service: LLMService,
+        stt: STTEngine,
+        tts: TTSEngine,
+        session_id: str = "default",
+        sample_rate: int = 16000,
+        vad_threshold: int = 500,
+        eou_silence_ms: int = 600,
+        queue_size: int = 32,
+    ):
+        self.get_engine = get_engine
+        self.llm_service = llm_service
+        self.stt = stt
+        self.tts = tts
+        self.session_id = session_id
+        self.sample_rate = sample_rate
+        self.vad_threshold = vad_threshold
+        self.eou_silence_ms = eou_silence_ms
+
+        self.audio_in: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.events: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._utterances: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self._sentences: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        # room prefetch scheduled by turns; kept referenced so the tasks are not garbage collected
+        self._background: set[asyncio.Task] = set()
+
+    async def run(self):
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(self._stt_stage())
+            tg.create_task(self._turn_stage())
+            tg.create_task(self._tts_stage())
+        await self.events.put(None)
+
+    def _now(self) -> float:
+        return asyncio.get_running_loop().time()
+
+    async def _stt_stage(self):
+        metrics: Optional[TurnMetrics] = None
+        silence_ms = 0.0
+        last_partial = ""
+
+        while (chunk := await self.audio_in.get()) is not None:
+            if chunk is END_OF_UTTERANCE:
+                if metrics is not None:
+                    await self._end_utterance(metrics)
+                metrics = None
+                silence_ms = 0.0
+                last_partial = ""
+                continue
+
+            if is_speech(chunk, self.vad_threshold):
+                if metrics is None:
+                    metrics = TurnMetrics(speech_end=self._now())
+                metrics.speech_end = self._now()
+                silence_ms = 0.0
+            elif metrics is None:
+                # silence before anyone speaks is not part of an utterance
+                continue
+            else:
+                silence_ms += len(chunk) / 2 / self.sample_rate * 1000
+
+            partial = await self.stt.feed(chunk)
+            if partial and partial != last_partial:
+                last_partial = partial
+                await self.events.put({"type": "partial", "text": partial})
+
+            if silence_ms >= self.eou_silence_ms:
+                await self._end_utterance(metrics)
+                metrics = None
+                silence_ms = 0.0
+                last_partial = ""
+
+        await self._utterances.put(None)
+
+    async def _end_utterance(self, metrics: TurnMetrics):
+        metrics.endpoint = self._now()
+        text = (await self.stt.finalize()).strip()
+        metrics.transcript = self._now()
+        await self.events.put({"type": "transcript", "text": text})
+        if text:
+            await self._utterances.put((text, metrics))
+
+    async def _turn_stage(self):
+        while (utterance := await self._utterances.get()) is not None:
+            (text, metrics) = utterance
+            await self._run_turn(text, metrics)
+        await self._sentences.put(None)
+
+    async def _run_turn(self, user_input: str, metrics: TurnMetrics):
+        engine = self.get_engine()
+        background_tasks = BackgroundTasks()
+        narrative = ""
+        pending = ""
+        result_text = ""
+        resolved = False
+        generator: Optional[asyncio.Task] = None
+
+        try:
+            # one admission deadline for classification and narration
+            deadline = self.llm_service.admission.deadline_for(Priority.INTERACTIVE)
+            (intent_data, narrative_prompt, result_text) = await engine.resolve_turn(user_input, self.llm_service, background_tasks, self.session_id, deadline)
+            resolved = True
+            metrics.intent = self._now()
+            await self.events.put({"type": "intent", "action": intent_data})
+
+            deltas: asyncio.Queue = asyncio.Queue()
+            generator = asyncio.create_task(self._generate_narration(narrative_prompt, deadline, deltas, metrics))
+
+            while (delta := await deltas.get()) is not None:
+                narrative += delta
+                await self.events.put({"type": "narration", "text": delta})
+
+                # hand each finished sentence to tts while the rest is still generating
+                (sentences, pending) = split_sentences(pending + delta)
+                for sentence in sentences:
+                    await self._queue_sentence(sentence, metrics)
+
+            try:
+                await generator
+            except Exception as e:
+                # the action has already been applied, so never fail the turn over its narration
+                print(f"Narration failed, using game logic result: {e}")
+                if not narrative:
+                    narrative = result_text
+                    await self.events.put({"type": "narration", "text": result_text})
+                    (sentences, pending) = split_sentences(result_text)
+                    for sentence in sentences:
+                        await self._queue_sentence(sentence, metrics)
+
+            if pending.strip():
+                await self._queue_sentence(pending.strip(), metrics)
+        except AdmissionRejected as e:
+            await self.events.put({"type": "error", "status": 503, "detail": f"server busy: {e.reason}", "retry_after": e.retry_after})
+        except Exception as e:
+            await self.events.put({"type": "error", "status": 500, "detail": f"game turn failed: {str(e)}"})
+        finally:
+            if generator is not None and not generator.done():
+                generator.cancel()
+            if resolved:
+                # record and save the applied action even if narration failed or the client went away
+                engine.record_turn(user_input, narrative or result_text)
+
+        # end-of-turn marker so the tts stage reports metrics after the last audio
+        await self._sentences.put((None, metrics))
+
+        if background_tasks.tasks:
+            task = asyncio.create_task(background_tasks())
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _generate_narration(self, prompt: str, deadline: float, deltas: asyncio.Queue, metrics: TurnMetrics):
+        # drain the model stream into an unbounded queue so a slow client never stalls generation
+        # while it holds one of the shared model-server slots
+        try:
+            async with aclosing(self.llm_service.stream_text(prompt, session_id=self.session_id, deadline=deadline)) as stream:
+                async for delta in stream:
+                    if metrics.first_token is None:
+                        metrics.first_token = self._now()
+                    deltas.put_nowait(delta)
+        finally:
+            deltas.put_nowait(None)
+
+    async def _queue_sentence(self, sentence: str, metrics: TurnMetrics):
+        if metrics.first_sentence is None:
+            metrics.first_sentence = self._now()
+        await self._sentences.put((sentence, metrics))
+
+    async def _tts_stage(self):
+        while (item := await self._sentences.get()) is not None:
+            (sentence, metrics) = item
+            if sentence is None:
+                metrics.done = self._now()
+                await self.events.put({"type": "turn_end", "metrics": metrics.to_dict()})
+                continue
+
+            await self.events.put({"type": "speech", "text": sentence, "sample_rate": self.tts.sample_rate})
+            async with aclosing(self.tts.synthesize(sentence)) as audio_chunks:
+                async for audio in audio_chunks:
+                    if metrics.first_audio is None:
+                        metrics.first_audio = self._now()
+                    await self.events.put(audio)
@@ -0,0 +1,17 @@
+from fastapi.testclient import TestClient
+
+from app import main
+from app.services.admission import AdmissionRejected
+
+
+def test_shed_turn_returns_503_with_retry_after(monkeypatch):
+    async def shed(*args, **kwargs):
+        raise AdmissionRejected("server is saturated", 7)
+
+    monkeypatch.setattr(main.game_engine, "process_turn", shed)
+
+    response = TestClient(main.app).post("/api/game/turn", json={"user_input": "look around"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "7"
+    assert "server is saturated" in response.json()["detail"]
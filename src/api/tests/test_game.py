@@ -0,0 +1,202 @@
+import asyncio
+import json
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app.game.game import GameEngine
+from app.game.generator import expand_room, prefetch_room
+from app.game.models import GameState, Item, PlayerState, Room
+from app.game.storage import load_game
+from app.services.admission import AdmissionController, AdmissionRejected, Priority
+
+
+ROOM_JSON = json.dumps({"description": "A flooded crypt.", "items": [{"name": "rusty key", "type": "KEY"}], "enemies": []})
+
+
+class StubLLMService:
+    """records every generate_text call; shed_after sheds calls beyond that many"""
+
+    def __init__(self, intent: dict | None = None, shed_after: int | None = None):
+        self.admission = AdmissionController(
+            max_concurrency=1,
+            queue_limits={p: 8 for p in Priority},
+            deadlines={p: 30.0 for p in Priority},
+            max_queued_per_session=8,
+        )
+        self.intent = intent or {"action": "look"}
+        self.shed_after = shed_after
+        self.calls = []
+
+    async def classify_intent(self, user_input, session_id="default", deadline=None):
+        self.calls.append(("classify", Priority.INTERACTIVE, deadline))
+        return self.intent
+
+    async def generate_text(self, prompt, system_prompt=None, priority=Priority.INTERACTIVE, session_id="default", deadline=None):
+        if self.shed_after is not None and len(self.calls) >= self.shed_after:
+            raise AdmissionRejected("server is saturated", 3)
+        self.calls.append(("generate", priority, deadline))
+        if system_prompt and "JSON" in system_prompt:
+            return ROOM_JSON
+        return "Something happens."
+
+
+class SlottedLLMService(StubLLMService):
+    """generate_text goes through the real admission controller, like LLMService; gate holds it mid-call"""
+
+    gate: asyncio.Event | None = None
+
+    async def generate_text(self, prompt, system_prompt=None, priority=Priority.INTERACTIVE, session_id="default", deadline=None):
+        async with self.admission.slot(priority, session_id, deadline):
+            if self.gate is not None:
+                await self.gate.wait()
+            await asyncio.sleep(0)
+            return await super().generate_text(prompt, system_prompt, priority, session_id, deadline)
+
+
+def two_room_engine(tmp_path) -> GameEngine:
+    start = Room(id="room_0", exits={"north": "room_1"}, description="A cold hall.", is_generated=True)
+    north = Room(id="room_1", exits={"south": "room_0"})
+    engine = GameEngine(str(tmp_path / "save.json"))
+    engine.state = GameState(theme="Sunken tombs", player=PlayerState(current_room_id="room_0"), rooms={"room_0": start, "room_1": north})
+    return engine
+
+
+def test_moving_into_unexpanded_room_expands_it_within_the_turn(tmp_path):
+    engine = two_room_engine(tmp_path)
+    llm = StubLLMService(intent={"action": "move", "direction": "north"})
+
+    (narrative, _) = asyncio.run(engine.process_turn("go north", llm))
+
+    north = engine.state.rooms["room_1"]
+    assert engine.state.player.current_room_id == "room_1"
+    assert north.is_generated
+    assert north.description == "A flooded crypt."
+    assert [i.name for i in north.items] == ["rusty key"]
+
+    # classify, expand and narrate all run at interactive priority under one shared deadline
+    assert [(kind, priority) for (kind, priority, _) in llm.calls] == [
+        ("classify", Priority.INTERACTIVE),
+        ("generate", Priority.INTERACTIVE),
+        ("generate", Priority.INTERACTIVE),
+    ]
+    assert len({deadline for (_, _, deadline) in llm.calls}) == 1
+
+
+def test_shed_move_leaves_player_in_place(tmp_path):
+    engine = two_room_engine(tmp_path)
+    llm = StubLLMService(intent={"action": "move", "direction": "north"}, shed_after=1)
+
+    with pytest.raises(AdmissionRejected):
+        asyncio.run(engine.process_turn("go north", llm))
+
+    assert engine.state.player.current_room_id == "room_0"
+    assert not engine.state.rooms["room_1"].is_generated
+
+
+def test_shed_prefetch_leaves_room_unexpanded(tmp_path):
+    engine = two_room_engine(tmp_path)
+    llm = StubLLMService(shed_after=0)
+    north = engine.state.rooms["room_1"]
+
+    asyncio.run(prefetch_room(north, engine.state.theme, llm, "A cold hall."))
+
+    assert not north.is_generated
+    assert north.description == ""
+
+
+def test_new_game_hands_shed_neighbours_to_prefetch(tmp_path):
+    engine = GameEngine(str(tmp_path / "save.json"))
+    # theme and start room get through, every neighbour expansion is shed
+    llm = StubLLMService(shed_after=2)
+    background_tasks = BackgroundTasks()
+
+    asyncio.run(engine.init_game(llm, background_tasks=background_tasks))
+
+    start = engine.state.rooms["room_0"]
+    assert start.is_generated
+    assert len(background_tasks.tasks) == len(start.exits)
+    assert all(task.func is prefetch_room for task in background_tasks.tasks)
+    assert len({deadline for (_, _, deadline) in llm.calls}) == 1
+
+
+def test_shed_narration_after_take_keeps_and_saves_the_action(tmp_path):
+    engine = two_room_engine(tmp_path)
+    engine.state.rooms["room_0"].items.append(Item(name="rusty key"))
+    # classification gets through, narration is shed
+    llm = StubLLMService(intent={"action": "take", "target": "key"}, shed_after=1)
+
+    (narrative, _) = asyncio.run(engine.process_turn("take key", llm))
+
+    assert narrative == "You took the rusty key."
+    saved = load_game(engine.save_path)
+    assert [i.name for i in saved.player.inventory] == ["rusty key"]
+    assert saved.rooms["room_0"].items == []
+    assert saved.history[-1] == "Action: take key | Result: You took the rusty key."
+
+
+def test_shed_narration_after_move_keeps_and_saves_the_action(tmp_path):
+    engine = two_room_engine(tmp_path)
+    engine.state.rooms["room_1"].description = "A flooded crypt."
+    engine.state.rooms["room_1"].is_generated = True
+    llm = StubLLMService(intent={"action": "move", "direction": "north"}, shed_after=1)
+
+    (narrative, _) = asyncio.run(engine.process_turn("go north", llm))
+
+    assert narrative.startswith("You move north.")
+    assert load_game(engine.save_path).player.current_room_id == "room_1"
+
+
+def test_turn_takes_over_queued_prefetch_of_the_same_room(tmp_path):
+    async def scenario():
+        engine = two_room_engine(tmp_path)
+        north = engine.state.rooms["room_1"]
+        llm = SlottedLLMService()
+
+        release = asyncio.Event()
+
+        async def hold():
+            async with llm.admission.slot(Priority.INTERACTIVE, "holder"):
+                await release.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+
+        prefetch = asyncio.create_task(prefetch_room(north, engine.state.theme, llm, "A cold hall."))
+        await asyncio.sleep(0)
+        turn = asyncio.create_task(expand_room(north, engine.state.theme, llm, "A cold hall.", priority=Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+
+        release.set()
+        await asyncio.gather(holder, prefetch, turn)
+        return (north, llm)
+
+    (north, llm) = asyncio.run(scenario())
+
+    assert [(kind, priority) for (kind, priority, _) in llm.calls] == [("generate", Priority.INTERACTIVE)]
+    assert [i.name for i in north.items] == ["rusty key"]
+    assert llm.admission.stats()["active"] == 0
+
+
+def test_prefetch_joins_expansion_already_in_flight(tmp_path):
+    async def scenario():
+        engine = two_room_engine(tmp_path)
+        north = engine.state.rooms["room_1"]
+        llm = SlottedLLMService()
+        llm.gate = asyncio.Event()
+
+        turn = asyncio.create_task(expand_room(north, engine.state.theme, llm, "A cold hall.", priority=Priority.INTERACTIVE))
+        await asyncio.sleep(0)
+        prefetch = asyncio.create_task(prefetch_room(north, engine.state.theme, llm, "A cold hall."))
+        await asyncio.sleep(0)
+
+        # the turn's expansion is mid-generation when the prefetch arrives
+        assert not north.is_generated
+        llm.gate.set()
+        await asyncio.gather(turn, prefetch)
+        return (north, llm)
+
+    (north, llm) = asyncio.run(scenario())
+
+    assert len(llm.calls) == 1
+    assert [i.name for i in north.items] == ["rusty key"]
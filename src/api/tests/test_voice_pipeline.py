@@ -0,0 +1,295 @@
+import asyncio
+import json
+import struct
+import time
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from app import main
+from app.services.admission import AdmissionController, AdmissionRejected, Priority
+from app.voice.engines import FakeSTTEngine, FakeTTSEngine, STT_ENGINES
+from app.voice.pipeline import END_OF_UTTERANCE, VoicePipeline, split_sentences
+
+
+# 20 ms pcm16 chunks at 16 khz
+LOUD = struct.pack("<320h", *([3000, -3000] * 160))
+QUIET = b"\x00\x00" * 320
+
+NARRATION = ["The torch", " flickers. Shadows", " dance on the wall! You", " wait."]
+SENTENCES = ["The torch flickers.", "Shadows dance on the wall!", "You wait."]
+
+
+class StubGameEngine:
+    def __init__(self):
+        self.turns = []
+        self.deadlines = []
+
+    async def resolve_turn(self, user_input, llm_service, background_tasks=None, session_id="default", deadline=None):
+        self.deadlines.append(deadline)
+        return ({"action": "look"}, f"narrate: {user_input}", "You look around.")
+
+    def record_turn(self, user_input, final_narrative):
+        self.turns.append((user_input, final_narrative))
+
+
+class StubLLMService:
+    def __init__(self, deltas=NARRATION):
+        self.admission = AdmissionController(
+            max_concurrency=1,
+            queue_limits={p: 8 for p in Priority},
+            deadlines={p: 30.0 for p in Priority},
+            max_queued_per_session=8,
+        )
+        self.deltas = deltas
+        self.deadlines = []
+        self.finished = False
+
+    async def stream_text(self, prompt, system_prompt=None, priority=Priority.INTERACTIVE, session_id="default", deadline=None):
+        self.deadlines.append(deadline)
+        async with self.admission.slot(priority, session_id, deadline):
+            for delta in self.deltas:
+                await asyncio.sleep(0)
+                yield delta
+        self.finished = True
+
+
+def make_pipeline(engine, llm, queue_size=64, script=None):
+    return VoicePipeline(
+        lambda: engine,
+        llm,
+        FakeSTTEngine(script=script or ["look around the room"]),
+        FakeTTSEngine(sample_rate=16000, ms_per_word=20),
+        sample_rate=16000,
+        eou_silence_ms=60,
+        queue_size=queue_size,
+    )
+
+
+async def run_pipeline(pipeline, chunks) -> list:
+    events = []
+
+    async def feed():
+        for chunk in chunks:
+            await pipeline.audio_in.put(chunk)
+        await pipeline.audio_in.put(None)
+
+    async def drain():
+        while (event := await pipeline.events.get()) is not None:
+            events.append(event)
+
+    await asyncio.gather(pipeline.run(), feed(), drain())
+    return events
+
+
+def event_types(events) -> list:
+    return ["audio" if isinstance(e, bytes) else e["type"] for e in events]
+
+
+def test_split_sentences_on_streamed_deltas():
+    sentences = []
+    pending = ""
+    for delta in NARRATION:
+        (done, pending) = split_sentences(pending + delta)
+        sentences.extend(done)
+
+    # the last sentence has no trailing whitespace yet, so it stays buffered until flushed
+    assert sentences == SENTENCES[:2]
+    assert pending.strip() == SENTENCES[2]
+
+
+def test_silence_ends_utterance_and_events_arrive_in_order():
+    engine = StubGameEngine()
+    llm = StubLLMService()
+    pipeline = make_pipeline(engine, llm)
+
+    events = asyncio.run(run_pipeline(pipeline, [QUIET] * 3 + [LOUD] * 4 + [QUIET] * 3))
+    types = event_types(events)
+
+    # silence before speech is ignored, each stage's first event follows the previous stage's
+    stages = ["partial", "transcript", "intent", "narration", "speech", "audio", "turn_end"]
+    assert [types.index(t) for t in stages] == sorted(types.index(t) for t in stages)
+    assert types[-1] == "turn_end"
+    assert types.count("turn_end") == 1
+
+    transcript = next(e for e in events if isinstance(e, dict) and e["type"] == "transcript")
+    assert transcript["text"] == "look around the room"
+    assert [e["text"] for e in events if isinstance(e, dict) and e["type"] == "speech"] == SENTENCES
+    assert engine.turns == [("look around the room", "".join(NARRATION))]
+
+
+def test_turn_end_metrics_are_filled_in():
+    llm = StubLLMService()
+    events = asyncio.run(run_pipeline(make_pipeline(StubGameEngine(), llm), [LOUD] * 2 + [QUIET] * 3))
+
+    metrics = events[-1]["metrics"]
+    assert set(metrics) == {
+        "endpoint_ms", "stt_ms", "classify_ms", "first_token_ms",
+        "first_sentence_ms", "tts_first_audio_ms", "mouth_to_ear_ms", "total_ms",
+    }
+    assert all(value is not None and value >= 0 for value in metrics.values())
+    assert metrics["mouth_to_ear_ms"] <= metrics["total_ms"]
+
+
+def test_end_marker_closes_utterance_before_silence_timeout():
+    engine = StubGameEngine()
+    pipeline = make_pipeline(engine, StubLLMService(), script=["go north", "take key"])
+
+    # a short pause does not end the first utterance; the explicit marker does
+    chunks = [LOUD, QUIET, LOUD, END_OF_UTTERANCE, LOUD, END_OF_UTTERANCE]
+    events = asyncio.run(run_pipeline(pipeline, chunks))
+
+    transcripts = [e["text"] for e in events if isinstance(e, dict) and e["type"] == "transcript"]
+    assert transcripts == ["go north", "take key"]
+    assert event_types(events).count("turn_end") == 2
+
+
+def test_turn_shares_one_deadline_between_classify_and_narration():
+    engine = StubGameEngine()
+    llm = StubLLMService()
+    asyncio.run(run_pipeline(make_pipeline(engine, llm), [LOUD, END_OF_UTTERANCE]))
+
+    assert engine.deadlines == llm.deadlines
+    assert engine.deadlines[0] is not None
+
+
+def test_slow_client_does_not_hold_model_slot():
+    async def scenario():
+        llm = StubLLMService(deltas=[f"word{i} " for i in range(50)] + ["end."])
+        pipeline = make_pipeline(StubGameEngine(), llm, queue_size=4)
+        runner = asyncio.create_task(pipeline.run())
+        await pipeline.audio_in.put(LOUD)
+        await pipeline.audio_in.put(END_OF_UTTERANCE)
+
+        # nobody reads events; generation must still finish and give its slot back
+        for _ in range(200):
+            await asyncio.sleep(0)
+            if llm.finished:
+                break
+        assert llm.finished
+        assert llm.admission.stats()["active"] == 0
+        assert pipeline.events.full()
+
+        await pipeline.audio_in.put(None)
+        while await pipeline.events.get() is not None:
+            pass
+        await runner
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_turn_releases_model_slot():
+    async def scenario():
+        release = asyncio.Event()
+
+        class HangingLLMService(StubLLMService):
+            async def stream_text(self, prompt, system_prompt=None, priority=Priority.INTERACTIVE, session_id="default", deadline=None):
+                async with self.admission.slot(priority, session_id, deadline):
+                    yield "The torch"
+                    await release.wait()
+
+        llm = HangingLLMService()
+        pipeline = make_pipeline(StubGameEngine(), llm)
+        runner = asyncio.create_task(pipeline.run())
+        await pipeline.audio_in.put(LOUD)
+        await pipeline.audio_in.put(END_OF_UTTERANCE)
+        while llm.admission.stats()["active"] == 0:
+            await asyncio.sleep(0)
+
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        assert llm.admission.stats()["active"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_shed_narration_falls_back_to_game_logic_result():
+    class ShedLLMService(StubLLMService):
+        async def stream_text(self, prompt, system_prompt=None, priority=Priority.INTERACTIVE, session_id="default", deadline=None):
+            raise AdmissionRejected("server is saturated", 3)
+            yield
+
+    engine = StubGameEngine()
+    events = asyncio.run(run_pipeline(make_pipeline(engine, ShedLLMService()), [LOUD, END_OF_UTTERANCE]))
+
+    # the action was applied, so the turn is spoken and recorded instead of reported as a 503
+    assert "error" not in event_types(events)
+    assert [e["text"] for e in events if isinstance(e, dict) and e["type"] == "speech"] == ["You look around."]
+    assert engine.turns == [("look around the room", "You look around.")]
+
+
+def test_turn_cancelled_mid_narration_is_still_recorded():
+    async def scenario():
+        class HangingLLMService(StubLLMService):
+            async def stream_text(self, prompt, system_prompt=None, priority=Priority.INTERACTIVE, session_id="default", deadline=None):
+                yield "The torch"
+                await asyncio.Event().wait()
+
+        engine = StubGameEngine()
+        pipeline = make_pipeline(engine, HangingLLMService())
+        runner = asyncio.create_task(pipeline.run())
+        await pipeline.audio_in.put(LOUD)
+        await pipeline.audio_in.put(END_OF_UTTERANCE)
+        while not any(isinstance(e, dict) and e["type"] == "narration" for e in pipeline.events._queue):
+            await asyncio.sleep(0)
+
+        # the client goes away while the narration is still streaming
+        runner.cancel()
+        await asyncio.gather(runner, return_exceptions=True)
+        return engine
+
+    engine = asyncio.run(scenario())
+    assert engine.turns == [("look around the room", "The torch")]
+
+
+def close_and_settle(ws):
+    # TestClient cancels the app right after the session exits; let the handler finish its own cleanup first
+    ws.close()
+    time.sleep(0.2)
+
+
+@pytest.fixture
+def voice_client(monkeypatch):
+    engine = StubGameEngine()
+    monkeypatch.setattr(main, "game_engine", engine)
+    monkeypatch.setattr(main, "llm_provider", StubLLMService())
+    return (TestClient(main.app), engine)
+
+
+def test_websocket_end_message_runs_a_turn(voice_client):
+    (client, engine) = voice_client
+
+    with client.websocket_connect("/ws/voice") as ws:
+        ws.send_bytes(LOUD)
+        ws.send_text(json.dumps({"type": "end"}))
+
+        types = []
+        while not types or types[-1] != "turn_end":
+            message = ws.receive()
+            types.append("audio" if message.get("bytes") else json.loads(message["text"])["type"])
+        close_and_settle(ws)
+
+    assert types.index("transcript") < types.index("intent") < types.index("speech") < types.index("audio")
+    assert engine.turns == [("look around", "".join(NARRATION))]
+
+
+def test_websocket_reports_pipeline_failure_and_closes(voice_client, monkeypatch):
+    (client, _) = voice_client
+
+    class BrokenSTTEngine(FakeSTTEngine):
+        async def feed(self, chunk):
+            raise RuntimeError("stt model crashed")
+
+    monkeypatch.setitem(STT_ENGINES, "broken", BrokenSTTEngine)
+    monkeypatch.setattr(main.settings, "VOICE_STT_ENGINE", "broken")
+
+    with client.websocket_connect("/ws/voice") as ws:
+        ws.send_bytes(LOUD)
+        error = ws.receive_json()
+        assert error["type"] == "error"
+        assert "stt model crashed" in error["detail"]
+        with pytest.raises(WebSocketDisconnect) as excinfo:
+            ws.receive_text()
+        assert excinfo.value.code == 1011
+        time.sleep(0.2)